@@ -1,6 +1,11 @@
 import requests
 import csv
+import hashlib
+import json
+import os
 import urllib3
+from concurrent.futures import ThreadPoolExecutor
+from jsondecode import decode_many, decode_response
 
 # Disable SSL warnings
 urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
@@ -10,13 +15,68 @@ server_file = "C:\\temp\\Audit\\NagiosServerWithAPIs.csv"
 hosts_file = "C:\\temp\\Audit\\Audit.txt"
 output_file = "C:\\temp\\Audit\\Audit_New_including_all_servers_26July.csv"
 
-# Read target hosts
-with open(hosts_file, 'r', encoding='utf-8') as f:
-    target_hosts = {line.strip().lower() for line in f if line.strip()}
+# Diff mode: compare against the previous audit output if it exists.
+# Only added, removed, moved and service-changed hosts are written to diff_file.
+previous_output_file = "C:\\temp\\Audit\\Audit_New_including_all_servers_19July.csv"
+diff_file = "C:\\temp\\Audit\\Audit_Diff_26July.csv"
+# Reuse the previous services for a host whose service config hash has not
+# changed instead of refetching servicestatus. Off by default: the hash only
+# covers services listing the host in host_name and services on hostgroups
+# named in the host's own hostgroups directive. It misses hostgroup members
+# set on the hostgroup side, nested hostgroup_members, host_name "*",
+# exclusions and host_name/hostgroup_name inherited through "use" templates,
+# so service changes made that way would not be detected.
+reuse_unchanged_services = False
+# Number of config downloads running at the same time
+fetch_workers = 8
+# (connect, read) timeout in seconds for each config download
+fetch_timeout = (10, 300)
 
-results = []
-found_hosts = set()
-seen_servers = set()
+# Hash of a config record, used to tell whether it changed since the last audit
+def config_hash(record):
+    return hashlib.sha1(json.dumps(record, sort_keys=True).encode('utf-8')).hexdigest()
+
+# Pull the record list out of a decoded config payload
+def config_records(data):
+    if isinstance(data, list):
+        return data
+    elif isinstance(data, dict):
+        for key in ["hostconfig", "serviceconfig", "hosts", "services", "data", "results"]:
+            if key in data and isinstance(data[key], list):
+                return data[key]
+    return []
+
+# Config fields may hold a single name or a list of names
+def name_list(value):
+    if isinstance(value, str):
+        value = value.split(",")
+    return [v.strip().lower() for v in value or [] if v.strip()]
+
+# Reduce a decoded config/host payload to host name -> hostgroups.
+# Runs in a decode worker so only the projection is sent back.
+def host_index(data):
+    return {host.get("host_name", "").strip().lower(): name_list(host.get("hostgroups"))
+            for host in config_records(data)}
+
+# Reduce a decoded config/service payload to the service hashes assigned to
+# each host and each hostgroup. Runs in a decode worker.
+def service_index(data):
+    hosts = {}
+    hostgroups = {}
+    for svc in config_records(data):
+        svc_hash = config_hash(svc)
+        for host in name_list(svc.get("host_name")):
+            hosts.setdefault(host, []).append(svc_hash)
+        for hostgroup in name_list(svc.get("hostgroup_name")):
+            hostgroups.setdefault(hostgroup, []).append(svc_hash)
+    return {"hosts": hosts, "hostgroups": hostgroups}
+
+# Hash of all the service config that applies to a host
+def service_hash(host, hostgroups, services):
+    hashes = list(services["hosts"].get(host, []))
+    for hostgroup in hostgroups:
+        hashes.extend(services["hostgroups"].get(hostgroup, []))
+    return hashlib.sha1("".join(sorted(hashes)).encode('utf-8')).hexdigest()
 
 # Function to get services
 def service_details(hostname, url, apikey):
@@ -27,90 +87,210 @@ def service_details(hostname, url, apikey):
     try:
         response = requests.get(base_url, verify=False)
         response.raise_for_status()
-        data = response.json()
+        data = decode_response(response, "servicestatus", ["service_description"])
         services = data.get('servicestatus', [])
         return services
-    except requests.RequestException as e:
+    except (requests.RequestException, ValueError) as e:
         print(f"Error contacting Nagios XI API: {e}")
         return []
 
-# Read Nagios server config
-with open(server_file, 'r', encoding='utf-8') as f:
-    reader = csv.DictReader(f)
-    for row in reader:
-        server = row['server_name'].strip().lower()
-        api_key = row['api_key'].strip()
+# Download a raw config payload (host or service) of a server, decoding is left to decode_many
+def fetch_config(server, api_key, object_type):
+    url = f"https://{server}/nagiosxi/api/v1/config/{object_type}"
+    params = {
+        "apikey": api_key,
+        "pretty": 1
+    }
 
-        if not server or not api_key or server in seen_servers:
-            continue
-        seen_servers.add(server)
+    try:
+        response = requests.get(url, params=params, verify=False, timeout=fetch_timeout)
+        response.raise_for_status()
+        return response.content
+    except requests.exceptions.Timeout:
+        print(f"Timeout while trying to reach {server}")
+    except requests.exceptions.RequestException as e:
+        print(f"Error with server {server}: {e}")
+    return None
 
-        print(f"🔍 Checking server: {server}")
+def main():
+    # Read target hosts
+    with open(hosts_file, 'r', encoding='utf-8') as f:
+        target_hosts = {line.strip().lower() for line in f if line.strip()}
 
-        url = f"https://{server}/nagiosxi/api/v1/config/host"
-        params = {
-            "apikey": api_key,
-            "pretty": 1
-        }
+    results = []
+    found_hosts = set()
+    seen_servers = set()
+    diff_rows = []
 
-        try:
-            response = requests.get(url, params=params, verify=False, timeout=500000)
-            response.raise_for_status()
-            data = response.json()
-
-            all_hosts = []
-            if isinstance(data, list):
-                all_hosts = [host.get("host_name", "").strip().lower() for host in data]
-            elif isinstance(data, dict):
-                for key in ["hostconfig", "hosts", "data", "results"]:
-                    if key in data and isinstance(data[key], list):
-                        all_hosts = [host.get("host_name", "").strip().lower() for host in data[key]]
-                        break
+    # Load the previous audit output into a host -> {server: row} index
+    previous = {}
+    diff_mode = os.path.exists(previous_output_file)
+    if diff_mode:
+        with open(previous_output_file, 'r', encoding='utf-8') as f:
+            for row in csv.DictReader(f):
+                if row.get("status") not in ("found", "found (not rechecked)"):
+                    continue
+                if row["host_name"] not in target_hosts:
+                    continue
+                previous.setdefault(row["host_name"], {})[row["server_name"]] = row
+        print(f"Diff mode: loaded {len(previous)} hosts from {previous_output_file}")
+    current = {}
+
+    # Read Nagios server config
+    servers = []
+    with open(server_file, 'r', encoding='utf-8') as f:
+        reader = csv.DictReader(f)
+        for row in reader:
+            server = row['server_name'].strip().lower()
+            api_key = row['api_key'].strip()
+
+            if not server or not api_key or server in seen_servers:
+                continue
+            seen_servers.add(server)
+            servers.append((server, api_key))
+
+    # Pull every server's host and service config together, then decode the payloads in parallel
+    print(f"🔍 Checking {len(servers)} servers: {', '.join(s for s, _ in servers)}")
+    server_names = [s for s, _ in servers]
+    executor = ThreadPoolExecutor(max_workers=fetch_workers)
+    try:
+        host_bodies = executor.map(lambda s: fetch_config(*s, "host"), servers)
+        service_bodies = executor.map(lambda s: fetch_config(*s, "service"), servers)
+        host_bodies, service_bodies = list(host_bodies), list(service_bodies)
+        executor.shutdown()
+        server_hosts = decode_many(host_bodies, projector=host_index, names=server_names)
+        server_services = decode_many(service_bodies, projector=service_index, names=server_names)
+    except KeyboardInterrupt:
+        # exit() would wait for the downloads still running in the pool, leave without joining them
+        executor.shutdown(wait=False, cancel_futures=True)
+        print("\nScript interrupted by user.", flush=True)
+        os._exit(1)
+
+    # Servers that could not be checked, their previous rows are carried forward
+    # as "found (not rechecked)" and left out of the diff
+    failed_servers = set()
 
+    for (server, api_key), all_hosts, services in zip(servers, server_hosts, server_services):
+        if all_hosts is None:
+            failed_servers.add(server)
+            continue
+
+        try:
             for host in target_hosts:
                 if host in all_hosts:
                     found_hosts.add(host)
+                    svc_hash = service_hash(host, all_hosts[host], services) if services else ""
+                    prev_row = previous.get(host, {}).get(server)
 
-                    # Get services for host
-                    services_data = service_details(host, f"https://{server}", api_key)
-                    service_names = [s.get("service_description", "") for s in services_data]
-                    service_list_str = "; ".join(service_names)
-                    service_count = len(service_names)
+                    if reuse_unchanged_services and svc_hash and prev_row and prev_row.get("service_hash") == svc_hash:
+                        # Service config unchanged since the last audit, skip the servicestatus call
+                        service_list_str = prev_row["services"]
+                        service_count = int(prev_row["service_count"] or 0)
+                    else:
+                        # Get services for host
+                        services_data = service_details(host, f"https://{server}", api_key)
+                        service_names = [s.get("service_description", "") for s in services_data]
+                        service_list_str = "; ".join(service_names)
+                        service_count = len(service_names)
 
-                    results.append({
+                    row = {
                         "host_name": host,
                         "server_name": server,
                         "status": "found",
                         "services": service_list_str,
-                        "service_count": service_count
-                    })
+                        "service_count": service_count,
+                        "service_hash": svc_hash
+                    }
+                    results.append(row)
+                    current.setdefault(host, {})[server] = row
+
+                    if prev_row and prev_row["services"] != service_list_str:
+                        diff_rows.append({
+                            "host_name": host,
+                            "change": "service_changed",
+                            "old_server_name": server,
+                            "new_server_name": server,
+                            "old_service_count": prev_row["service_count"],
+                            "new_service_count": service_count
+                        })
 
-        except requests.exceptions.Timeout:
-            print(f"Timeout while trying to reach {server}")
-        except requests.exceptions.RequestException as e:
-            print(f"Error with server {server}: {e}")
         except KeyboardInterrupt:
             print("\nScript interrupted by user.")
             exit()
         except Exception as e:
             print(f"Unexpected error with server {server}: {e}")
+            failed_servers.add(server)
+
+    if failed_servers:
+        print(f"⚠️ Not compared, previous results kept as 'found (not rechecked)' for: {', '.join(sorted(failed_servers))}")
+        for host, prev_servers in previous.items():
+            for server in failed_servers:
+                if server in prev_servers and server not in current.get(host, {}):
+                    prev_row = prev_servers[server]
+                    row = {
+                        "host_name": host,
+                        "server_name": server,
+                        "status": "found (not rechecked)",
+                        "services": prev_row["services"],
+                        "service_count": int(prev_row["service_count"] or 0),
+                        # No hash, so these services are never reused as if they were fresh
+                        "service_hash": ""
+                    }
+                    results.append(row)
+                    current.setdefault(host, {})[server] = row
+                    found_hosts.add(host)
+
+    # Add not found hosts
+    not_found_hosts = target_hosts - found_hosts
+    for host in not_found_hosts:
+        results.append({
+            "host_name": host,
+            "server_name": "Host not found in any server or inactive",
+            "status": "Inactive/Not Found",
+            "services": "",
+            "service_count": 0,
+            "service_hash": ""
+        })
+
+    # Write to CSV
+    with open(output_file, 'w', newline='', encoding='utf-8') as f:
+        fieldnames = ["host_name", "server_name", "status", "services", "service_count", "service_hash"]
+        writer = csv.DictWriter(f, fieldnames=fieldnames)
+        writer.writeheader()
+        writer.writerows(results)
+
+    print(f"\n✅ Matching complete. Results saved to: {output_file}")
+
+    # Write the diff against the previous audit
+    if diff_mode:
+        for host in sorted(set(previous) | set(current)):
+            old_servers = previous.get(host, {})
+            new_servers = current.get(host, {})
+            if set(old_servers) == set(new_servers):
+                continue
+            if not old_servers:
+                change = "added"
+            elif not new_servers:
+                change = "removed"
+            else:
+                change = "moved"
+            diff_rows.append({
+                "host_name": host,
+                "change": change,
+                "old_server_name": "; ".join(sorted(old_servers)),
+                "new_server_name": "; ".join(sorted(new_servers)),
+                "old_service_count": sum(int(r["service_count"] or 0) for r in old_servers.values()),
+                "new_service_count": sum(r["service_count"] for r in new_servers.values())
+            })
+
+        with open(diff_file, 'w', newline='', encoding='utf-8') as f:
+            fieldnames = ["host_name", "change", "old_server_name", "new_server_name",
+                          "old_service_count", "new_service_count"]
+            writer = csv.DictWriter(f, fieldnames=fieldnames)
+            writer.writeheader()
+            writer.writerows(diff_rows)
+
+        print(f"✅ {len(diff_rows)} changes since {previous_output_file} saved to: {diff_file}")
 
-# Add not found hosts
-not_found_hosts = target_hosts - found_hosts
-for host in not_found_hosts:
-    results.append({
-        "host_name": host,
-        "server_name": "Host not found in any server or inactive",
-        "status": "Inactive/Not Found",
-        "services": "",
-        "service_count": 0
-    })
-
-# Write to CSV
-with open(output_file, 'w', newline='', encoding='utf-8') as f:
-    fieldnames = ["host_name", "server_name", "status", "services", "service_count"]
-    writer = csv.DictWriter(f, fieldnames=fieldnames)
-    writer.writeheader()
-    writer.writerows(results)
-
-print(f"\n✅ Matching complete. Results saved to: {output_file}")
+if __name__ == "__main__":
+    main()
@@ -1,10 +1,22 @@
 import requests
 import json
+import os
 import time
+import threading
 import urllib3
 import pandas as pd
 from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from jsondecode import decode_response
 urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
+
+# Contact group membership rarely changes, so it is kept for a long time and
+# persisted to disk between runs. Entries are keyed by server URL.
+CONTACT_GROUP_CACHE_FILE = "contact_group_cache.json"
+CONTACT_GROUP_CACHE_TTL = 24 * 60 * 60  # seconds
+CONTACT_GROUP_WORKERS = 8
+_contact_group_cache = None
+_contact_group_lock = threading.Lock()
 # --- Host Groups for a Host ---
 def get_host_groups_for_host(hostname, url, apikey):
     base_url = (
@@ -37,14 +49,14 @@ def service_details(hostname,url,apikey):
     try:
         response = requests.get(base_url, verify=False)
         response.raise_for_status()
-        data = response.json()
+        data = decode_response(response, "servicestatus", ["host_name", "service_description", "current_state"])
 
         services = data.get('servicestatus', [])
         if not services:
             print(f"No services found for host: {hostname}")
         return services
 
-    except requests.RequestException as e:
+    except (requests.RequestException, ValueError) as e:
         print(f"Error contacting Nagios XI API: {e}")
         return []
 
@@ -146,8 +158,9 @@ def host_details(hostname, url, apikey):
             if contact_groups:
                 show_members = input("\nDo you want to see the members of the contact group(s)? (yes/no): ").strip().lower()
                 if show_members == "yes":
+                    group_members = get_members_of_contact_groups(contact_groups, url, apikey)
                     for contact_group in contact_groups:
-                        members = get_members_of_contact_group(contact_group, url, apikey)
+                        members = group_members.get(contact_group, [])
                         if members:
                             print(f"\nMembers of contact group '{contact_group}':")
                             for member in members:
@@ -201,7 +214,7 @@ def get_down_hosts(api_key, url):
     try:
         response = requests.get(baseurl, params=params, verify=False)
         response.raise_for_status()
-        data = response.json()
+        data = decode_response(response, "hoststatus", ["host_name"])
 
         if "hoststatus" in data and data["hoststatus"]:
             print("Down Hosts:")
@@ -211,7 +224,7 @@ def get_down_hosts(api_key, url):
             print(f"Total Down Hosts: {len(data['hoststatus'])}")
         else:
             print("No down hosts found or API returned no results.")
-    except requests.exceptions.RequestException as e:
+    except (requests.exceptions.RequestException, ValueError) as e:
         print(f"Error contacting Nagios XI API: {e}")
 
 # --- Unreachable Hosts ---
@@ -226,7 +239,7 @@ def unreachable_down_hosts(api_key, url):
     try:
         response = requests.get(baseurl, params=params, verify=False)
         response.raise_for_status()
-        data = response.json()
+        data = decode_response(response, "hoststatus", ["host_name"])
 
         if "hoststatus" in data and data["hoststatus"]:
             print("unreachable Hosts:")
@@ -236,7 +249,7 @@ def unreachable_down_hosts(api_key, url):
             print(f"Total unreachable Hosts: {len(data['hoststatus'])}")
         else:
             print("No Unreachable hosts found or API returned no results.")
-    except requests.exceptions.RequestException as e:
+    except (requests.exceptions.RequestException, ValueError) as e:
         print(f"Error contacting Nagios XI API: {e}")
 
 # get all the hosts in alphabetical order
@@ -250,7 +263,7 @@ def get_all_hosts_sorted(url, apikey):
     try:
         response = requests.get(base_url, verify=False)
         response.raise_for_status()
-        data = response.json()
+        data = decode_response(response, "hoststatus", ["host_name"])
 
         if "hoststatus" in data:
             for host in data["hoststatus"]:
@@ -262,7 +275,7 @@ def get_all_hosts_sorted(url, apikey):
         # print(f"Total Hosts Found: {len(sorted_hosts)}")
         return sorted_hosts
 
-    except requests.exceptions.RequestException as e:
+    except (requests.exceptions.RequestException, ValueError) as e:
         print(f"Error fetching hosts: {e}")
         return []
 
@@ -275,14 +288,14 @@ def service_details(hostname,url,apikey):
     try:
         response = requests.get(base_url, verify=False)
         response.raise_for_status()
-        data = response.json()
+        data = decode_response(response, "servicestatus", ["host_name", "service_description", "current_state"])
 
         services = data.get('servicestatus', [])
         if not services:
             print(f"No services found for host: {hostname}")
         return services
 
-    except requests.RequestException as e:
+    except (requests.RequestException, ValueError) as e:
         print(f"Error contacting Nagios XI API: {e}")
         return []
 
@@ -304,18 +317,178 @@ def get_hosts_from_hostgroup(hostgroup_name, url, apikey):
 
 # --- Members from Contact Group ---
 def get_members_of_contact_group(contactgroup_name, url, apikey):
+    """
+    Look up a single contact group. Returns [] for a group with no members and None when the
+    lookup failed, so only real answers end up in the contact group cache.
+    """
     base_url = f"{url}/nagiosxi/api/v1/objects/contactgroupmembers?apikey={apikey}&contactgroup_name={contactgroup_name}&pretty=1"
     try:
         response = requests.get(base_url, verify=False)
         response.raise_for_status()
-        data = response.json()
+        data = decode_response(response, "contactgroup", ["members"])
+
+        groups = data["contactgroup"]
+        return _contact_names(groups[0]) if groups else []
+    except (requests.RequestException, ValueError, KeyError, AttributeError) as e:
+        print(f"Error fetching members of contact group '{contactgroup_name}': {e}")
+        return None
+
+# --- Contact Group Membership Cache ---
+def _load_contact_group_cache():
+    global _contact_group_cache
+    if _contact_group_cache is None:
+        _contact_group_cache = {}
+        if os.path.exists(CONTACT_GROUP_CACHE_FILE):
+            try:
+                with open(CONTACT_GROUP_CACHE_FILE, 'r', encoding='utf-8') as f:
+                    _contact_group_cache = json.load(f)
+            except (OSError, ValueError) as e:
+                print(f"Ignoring unreadable contact group cache: {e}")
+    return _contact_group_cache
+
+def _save_contact_group_cache():
+    try:
+        with open(CONTACT_GROUP_CACHE_FILE, 'w', encoding='utf-8') as f:
+            json.dump(_contact_group_cache, f)
+    except OSError as e:
+        print(f"Could not write contact group cache: {e}")
 
-        contacts = data["contactgroup"][0]["members"]["contact"]
-        contact_names = [c["contact_name"] for c in contacts]
-        return contact_names
-    except (requests.RequestException, KeyError, IndexError) as e:
-        print(f"Error: {e}")
+def _cached_server_entry(url):
+    """
+    Return the cache entry for a server, starting a fresh one if it is missing or expired.
+    Must be called with _contact_group_lock held.
+    """
+    cache = _load_contact_group_cache()
+    entry = cache.get(url)
+    if not entry or time.time() - entry.get("fetched_at", 0) > CONTACT_GROUP_CACHE_TTL:
+        entry = {"fetched_at": time.time(), "complete": False, "groups": {}}
+        cache[url] = entry
+    return entry
+
+def _contact_names(group):
+    contacts = group.get("members", {}).get("contact", [])
+    if isinstance(contacts, dict):
+        contacts = [contacts]
+    return [c["contact_name"] for c in contacts]
+
+def get_all_contact_group_members(url, apikey, force_refresh=False):
+    """
+    Pull the membership of every contact group on a server in one request.
+    Returns a dict of contact group name -> list of contact names, served from cache when fresh.
+    """
+    with _contact_group_lock:
+        entry = _cached_server_entry(url)
+        if entry["complete"] and not force_refresh:
+            return dict(entry["groups"])
+
+    base_url = f"{url}/nagiosxi/api/v1/objects/contactgroupmembers?apikey={apikey}&pretty=1"
+    try:
+        response = requests.get(base_url, verify=False)
+        response.raise_for_status()
+        # Raises ValueError for an error body such as {"error": ...}, so it is never cached
+        data = decode_response(response, "contactgroup", ["contactgroup_name", "members"])
+
+        groups = {}
+        for group in data["contactgroup"]:
+            name = group.get("contactgroup_name")
+            if name:
+                groups[name] = _contact_names(group)
+    except (requests.RequestException, ValueError, KeyError, AttributeError) as e:
+        print(f"Error fetching contact group members: {e}")
+        return None
+
+    with _contact_group_lock:
+        _contact_group_cache[url] = {"fetched_at": time.time(), "complete": True, "groups": groups}
+        _save_contact_group_cache()
+    return dict(groups)
+
+def get_members_of_contact_groups(contact_groups, url, apikey):
+    """
+    Resolve the members of several contact groups at once.
+    Uses the bulk membership pull, and looks up any groups it could not cover concurrently.
+    """
+    all_members = get_all_contact_group_members(url, apikey)
+    if all_members is not None:
+        # A complete bulk pull is authoritative, groups missing from it have no members
+        return {g: all_members.get(g, []) for g in contact_groups}
+
+    result = {}
+    with _contact_group_lock:
+        cached = _cached_server_entry(url)["groups"]
+        for g in contact_groups:
+            if g in cached:
+                result[g] = cached[g]
+    missing = [g for g in contact_groups if g not in result]
+    if not missing:
+        return result
+
+    with ThreadPoolExecutor(max_workers=CONTACT_GROUP_WORKERS) as executor:
+        fetched = list(executor.map(lambda g: get_members_of_contact_group(g, url, apikey), missing))
+
+    with _contact_group_lock:
+        entry = _cached_server_entry(url)
+        for group, members in zip(missing, fetched):
+            if members is not None:
+                entry["groups"][group] = members
+        _save_contact_group_cache()
+    for group, members in zip(missing, fetched):
+        result[group] = members or []
+    return result
+
+def get_contact_host_index(url, apikey, force_refresh=False):
+    """
+    Build the contact -> hosts reverse index for a server, covering contacts set directly on a host
+    and members of its contact groups. Contact names are lowercased. The index is kept in the
+    contact group cache and expires with it.
+    """
+    with _contact_group_lock:
+        entry = _cached_server_entry(url)
+        if "contact_hosts" in entry and not force_refresh:
+            return entry["contact_hosts"]
+
+    base_url = (
+        f"{url}/nagiosxi/api/v1/config/host"
+        f"?apikey={apikey}&pretty=1"
+    )
+    try:
+        response = requests.get(base_url, verify=False)
+        response.raise_for_status()
+        data = decode_response(response, fields=["host_name", "contacts", "contact_groups"])
+    except (requests.RequestException, ValueError) as e:
+        print(f"Error contacting Nagios XI API: {e}")
+        return None
+
+    all_groups = set()
+    for host in data:
+        all_groups.update(host.get("contact_groups", []))
+    group_members = get_members_of_contact_groups(sorted(all_groups), url, apikey)
+
+    index = {}
+    for host in data:
+        hostname = host.get("host_name")
+        if not hostname:
+            continue
+        contacts = set(host.get("contacts", []))
+        for group in host.get("contact_groups", []):
+            contacts.update(group_members.get(group, []))
+        for contact in contacts:
+            index.setdefault(contact.strip().lower(), set()).add(hostname)
+    index = {c: sorted(h, key=lambda x: x.lower()) for c, h in index.items()}
+
+    with _contact_group_lock:
+        _cached_server_entry(url)["contact_hosts"] = index
+        _save_contact_group_cache()
+    return index
+
+# --- Hosts for a Contact ---
+def get_hosts_for_contact(contact_name, url, apikey):
+    """
+    Reverse lookup: every host a contact is notified for, either directly or through a contact group.
+    """
+    index = get_contact_host_index(url, apikey)
+    if index is None:
         return []
+    return index.get(contact_name.strip().lower(), [])
 
 # get duplicate hosts
 def get_duplicate_hosts(url, apikey):
@@ -348,7 +521,7 @@ def fetch_and_summarize_nagios_hosts(url, apikey, output_excel_path="nagios_host
         return
 
     try:
-        data = response.json()
+        data = decode_response(response, "hoststatus", ["host_name", "name", "current_state"])
         hosts_data = data.get("hoststatus", [])
     except Exception as e:
         print(f"Error parsing response JSON: {e}")
@@ -517,9 +690,10 @@ def main():
         print("8. Get All Hosts with Categorized Summary")
         print("9. Get Duplicate Hosts")
         print("10. Fetch Hosts from Multiple Hostgroups and Export to Excel")
-        print("11. Exit")
+        print("11. List Hosts for a Contact")
+        print("12. Exit")
 
-        choice = input("Enter your choice (1-11): ").strip()
+        choice = input("Enter your choice (1-12): ").strip()
 
         if choice == "1":
             hostname = input("Enter Host Name: ").strip()
@@ -568,7 +742,7 @@ def main():
 
         elif choice == "6":
             contactgroup_name = input("Enter Contactgroup Name: ").strip()
-            contacts = get_members_of_contact_group(contactgroup_name, url, apikey)
+            contacts = get_members_of_contact_groups([contactgroup_name], url, apikey)[contactgroup_name]
             if contacts:
                 print("\nContacts in Contactgroup:")
                 for contact in contacts:
@@ -591,6 +765,16 @@ def main():
             print("\nFetching hosts from multiple hostgroups...")
             fetch_multiple_hostgroups_and_export(url, apikey)
         elif choice == "11":
+            contact_name = input("Enter Contact Name: ").strip()
+            hosts = get_hosts_for_contact(contact_name, url, apikey)
+            if hosts:
+                print(f"\nHosts for contact '{contact_name}':")
+                for host in hosts:
+                    print(f"- {host}")
+                print(f"Total Hosts Found: {len(hosts)}")
+            else:
+                print("No hosts found for this contact.")
+        elif choice == "12":
             print("Exiting... Goodbye!")
             break
 
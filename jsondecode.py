@@ -0,0 +1,107 @@
+import json
+from concurrent.futures import ProcessPoolExecutor
+
+# Use orjson when it is installed, it decodes large payloads several times faster
+try:
+    import orjson
+    loads = orjson.loads
+except ImportError:
+    loads = json.loads
+
+# Bodies smaller than this are decoded in the main process, a worker round trip costs more
+PARALLEL_DECODE_THRESHOLD = 1024 * 1024  # bytes
+DECODE_WORKERS = None  # defaults to the number of CPUs
+
+
+def records_of(data, key=None):
+    """
+    Return the record list of a decoded payload: data[key] when key is given, otherwise data itself.
+    Raises ValueError when the payload does not have that shape, e.g. an {"error": ...} body.
+    A payload with a recordcount but no key is an empty result.
+    """
+    if key:
+        if isinstance(data, dict) and key not in data and "recordcount" in data and "error" not in data:
+            return []
+        if not isinstance(data, dict) or not isinstance(data.get(key), list):
+            raise ValueError(f"Unexpected response, expected a '{key}' list: {str(data)[:200]}")
+        return data[key]
+    if not isinstance(data, list):
+        raise ValueError(f"Unexpected response, expected a list: {str(data)[:200]}")
+    return data
+
+
+def project(data, key=None, fields=None):
+    """
+    Keep only the given fields of each record.
+    Records are read from data[key] when key is given, otherwise data is expected to be a list.
+    The shape of data is preserved so callers can keep using data.get(key, []).
+    """
+    records = records_of(data, key)
+    if fields:
+        records = [{f: r.get(f) for f in fields if f in r} for r in records]
+    if key:
+        data = dict(data)
+        data[key] = records
+        return data
+    return records
+
+
+def decode(body, key=None, fields=None, projector=None):
+    """
+    Decode a raw JSON body and project it.
+    projector, if given, is called with the decoded data instead of the key/fields projection.
+    """
+    data = loads(body)
+    if projector:
+        return projector(data)
+    return project(data, key, fields)
+
+
+def decode_response(response, key=None, fields=None):
+    """
+    Decode a requests response with the fast decoder and keep only the given fields.
+    """
+    return decode(response.content, key, fields)
+
+
+def _decode_error(i, names, e):
+    label = names[i] if names else f"response {i}"
+    print(f"Error parsing response JSON from {label}: {e}")
+
+
+def decode_many(bodies, key=None, fields=None, projector=None, names=None):
+    """
+    Decode several raw JSON bodies, handing the large ones to a process pool.
+    Only the projected data comes back from the workers. projector must be a module level
+    function so it can be sent to a worker.
+    names, if given, labels each body in error messages (e.g. the server it came from).
+    Returns results in the same order as bodies, None for a body that failed to decode.
+    """
+    results = [None] * len(bodies)
+    large = [i for i, b in enumerate(bodies) if b is not None and len(b) >= PARALLEL_DECODE_THRESHOLD]
+    if len(large) < 2:
+        large = []
+
+    futures = {}
+    executor = ProcessPoolExecutor(max_workers=DECODE_WORKERS) if large else None
+    try:
+        for i in large:
+            futures[i] = executor.submit(decode, bodies[i], key, fields, projector)
+
+        for i, body in enumerate(bodies):
+            if body is None or i in futures:
+                continue
+            try:
+                results[i] = decode(body, key, fields, projector)
+            except Exception as e:
+                _decode_error(i, names, e)
+
+        for i, future in futures.items():
+            try:
+                results[i] = future.result()
+            except Exception as e:
+                _decode_error(i, names, e)
+    finally:
+        if executor:
+            executor.shutdown(cancel_futures=True)
+    return results